@@ -10,8 +10,11 @@ class PyNode:
     def get_inmidiate_text_node(self) -> PyNode: ...
     def get_inmidiate_node(self) -> PyNode: ...
     def get_all_nodes(self) -> t.List[PyNode]: ...
+    def get_layout_tokens(self) -> t.List[t.Tuple[str, t.Optional[str]]]: ...
     def get_text_nodes(self) -> t.List[PyNode]: ...
     def get_nodes(self, node_type: str) -> t.List[PyNode]: ...
 
 def request(url: str) -> str: ...
 def load(body: str) -> PyNode: ...
+def request_bytes(url: str) -> t.Tuple[int, bytes]: ...
+def load_bytes(body: bytes) -> PyNode: ...
@@ -1,20 +1,58 @@
 import typing as t
+import collections
+import contextlib
+import functools
+import hashlib
+import itertools
+import os
+import tempfile
+import time
+import types
 import tkinter
 import tkinter.font
 
+import numpy as np
+
 import ewb
 
-XYTextFont = t.Tuple[float, float, str, tkinter.font.Font]
+FontMetrics = t.Mapping[str, int]
+XYTextFont = t.Tuple[float, float, str, tkinter.font.Font, FontMetrics]
 FontWeight = t.Literal['normal', 'bold']
 FontStyle = t.Literal['roman', 'italic']
 FontDefinition = t.Tuple[int, FontWeight, FontStyle]
-FontValue = t.Tuple['tkinter.font.Font', 'tkinter.Label']
+# (font, width of a single space, ascent/descent/linespace metrics)
+FontValue = t.Tuple['tkinter.font.Font', int, FontMetrics]
+
+
+class LineEntry(t.NamedTuple):
+    x: int
+    word: str
+    font: 'tkinter.font.Font'
+    metrics: FontMetrics
+
 
 WIDTH = 1024
 HEIGHT = 600
 HSTEP, VSTEP = 13, 18
+RIGHT_MARGIN = WIDTH - HSTEP
+LEADING = 1.25
 SCROLL_STEP = 100
 FONTS: dict[FontDefinition, FontValue] = {}
+# tag -> (size delta, weight, style) applied to the tag's text
+STYLE_DELTAS: dict[str, t.Tuple[int, FontWeight, FontStyle]] = {
+    "i": (0, "normal", "italic"),
+    "b": (0, "bold", "roman"),
+    "small": (-2, "normal", "roman"),
+    "big": (4, "normal", "roman"),
+    "h1": (10, "normal", "roman"),
+}
+# tag -> extra vertical space added after the line break
+BREAK_TAGS: dict[str, int] = {"p": VSTEP, "h1": 0, "br": 0}
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "ewb")
+CACHE_MAX_AGE = 60 * 60  # seconds
+MEASURE_BATCH = 64
+WORD_WIDTHS_SIZE = 4096
+WORD_WIDTHS: 't.OrderedDict[t.Tuple[FontDefinition, str], int]' = collections.OrderedDict()
 
 # class Text:
 #     def __init__(self, text):
@@ -33,100 +71,229 @@ FONTS: dict[FontDefinition, FontValue] = {}
 #         return "Tag('{}')".format(self.tag)
 
 
-def get_font(size: int, weight: FontWeight, style: FontStyle):
+@functools.lru_cache(maxsize=None)
+def get_measure_label() -> 'tkinter.Label':
+    # A single widget shared by every font, only used to reach the Tcl interpreter
+    return tkinter.Label()
+
+
+def get_font(size: int, weight: FontWeight, style: FontStyle) -> FontValue:
     key = (size, weight, style)
 
     if key not in FONTS:
         font = tkinter.font.Font(size=size, weight=weight,
             slant=style)
-        label = tkinter.Label(font=font)
-        FONTS[key] = (font, label)
+        metrics = types.MappingProxyType(t.cast(t.Dict[str, int], font.metrics()))
+        FONTS[key] = (font, font.measure(" "), metrics)
+
+    return FONTS[key]
+
+
+def measure(key: FontDefinition, font: 'tkinter.font.Font', word: str) -> int:
+    cache_key = (key, word)
+    w = WORD_WIDTHS.get(cache_key)
+
+    if w is None:
+        w = font.measure(word)
+        WORD_WIDTHS[cache_key] = w
+        # Evict the least recently used width
+        if len(WORD_WIDTHS) > WORD_WIDTHS_SIZE:
+            WORD_WIDTHS.popitem(last=False)
+    else:
+        WORD_WIDTHS.move_to_end(cache_key)
+
+    return w
+
+
+def measure_many(key: FontDefinition, words: t.Iterable[str]) -> None:
+    missing = list(dict.fromkeys(word for word in words if (key, word) not in WORD_WIDTHS))
+    if not missing: return
+
+    font, _, _ = get_font(*key)
+    label = get_measure_label()
+    # Tk has no batch measure command, run the loop inside Tcl so the
+    # whole batch costs a single call from Python
+    widths = label.tk.splitlist(
+        label.tk.call("lmap", "w", tuple(missing), f"font measure {font.name} $w")
+    )
+
+    for word, w in zip(missing, widths):
+        WORD_WIDTHS[(key, word)] = int(w)
+
+    while len(WORD_WIDTHS) > WORD_WIDTHS_SIZE:
+        WORD_WIDTHS.popitem(last=False)
+
+
+def cache_path(url: str) -> str:
+    return os.path.join(CACHE_DIR, hashlib.blake2b(url.encode()).hexdigest() + ".html")
+
+
+def read_cached(url: str) -> t.Optional[bytes]:
+    path = cache_path(url)
+
+    try:
+        if time.time() - os.path.getmtime(path) > CACHE_MAX_AGE:
+            os.unlink(path)
+            return None
+        with open(path, "rb") as f:
+            return f.read()
+    except OSError:
+        return None
+
 
-    return FONTS[key][0]
+def prune_cache() -> None:
+    # Expired pages of URLs that are never loaded again, and temporary files
+    # left behind by writers that were killed, are only removed here
+    now = time.time()
+
+    try:
+        entries = list(os.scandir(CACHE_DIR))
+    except OSError:
+        return
+
+    for entry in entries:
+        if not entry.name.endswith((".html", ".tmp")):
+            continue
+        with contextlib.suppress(OSError):
+            if now - entry.stat().st_mtime > CACHE_MAX_AGE:
+                os.unlink(entry.path)
+
+
+def write_cached(url: str, body: bytes) -> None:
+    prune_cache()
+
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=CACHE_DIR, suffix=".tmp")
+    except OSError:
+        # The disk cache is best effort, the page is still usable
+        return
+
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(body)
+        # Readers only ever see a complete file, never a partial write
+        os.replace(tmp_path, cache_path(url))
+    except OSError:
+        pass
+    finally:
+        # Left behind only when the write or the rename did not complete
+        with contextlib.suppress(OSError):
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+
+
+@functools.lru_cache(maxsize=64)
+def fetch_and_parse(url: str) -> 'ewb.PyNode':
+    body = read_cached(url)
+
+    if body is None:
+        status, body = ewb.request_bytes(url)
+        # Only successful responses are cached, errors are fetched again next time
+        if status == 200:
+            write_cached(url, body)
+
+    return ewb.load_bytes(body)
 
 
 class Layout:
-    def __init__(self, root: 'ewb.PyNode'):
+    def __init__(self, root: 'ewb.PyNode') -> None:
         self.root = root
         self.display_list: t.List[XYTextFont] = []
 
         self.cursor_x = HSTEP
-        self.cursor_y = VSTEP
+        self.cursor_y = float(VSTEP)
         self.weight: FontWeight = "normal"
         self.style: FontStyle = "roman"
         self.size = 12
 
-        tokens = self.root.get_all_nodes()
+        # Flattened (tag name, immediate text) pairs, collected in Rust
+        tokens = self.root.get_layout_tokens()
 
-        self.line: t.List[t.Tuple[int, str, 'tkinter.font.Font']] = []
+        self.line: t.List[LineEntry] = []
+        # Words waiting to be measured together before being placed
+        self.pending: t.List[t.Tuple[str, FontDefinition]] = []
 
-        for tok in tokens:
-            self.token(tok)
+        for token_type, content in tokens:
+            self.token(token_type, content)
 
+        self.place_pending()
         self.flush()
 
-    def token(self, token: 'ewb.PyNode'):
-        token_type = token.data.tag_name
-        style = self.style
-        weight = self.weight
-        size = self.size
-
-        # Set content style
-        if token_type == "i":
-            style = "italic"
-        elif token_type == "b":
-            weight = "bold"
-        elif token_type == "small":
-            size -= 2
-        elif token_type == "big":
-            size += 4
-        elif token_type == "h1":
-            size += 10
-
-        token_content = token.get_inmidiate_text_node()
-
-        if token_content:
-            content = token_content.data.attributes.get('content', '')
-            self.word(content, size, weight, style)
-
-        if token_type == "p":
-            self.flush()
-            self.cursor_y += VSTEP
-        if token_type == "h1":
-            self.flush()
-        elif token_type == "br":
+    def token(self, token_type: str, content: t.Optional[str]) -> None:
+        if content:
+            delta = STYLE_DELTAS.get(token_type)
+            if delta is None:
+                size, weight, style = self.size, self.weight, self.style
+            else:
+                size_delta, weight, style = delta
+                size = self.size + size_delta
+
+            # Lay out word by word so lines wrap at word boundaries
+            for word in content.split():
+                self.word(word, size, weight, style)
+
+        space = BREAK_TAGS.get(token_type)
+        if space is not None:
+            self.place_pending()
             self.flush()
+            self.cursor_y += space
 
 
-    def word(self, word: str, size: int, weight: FontWeight, style: FontStyle):
-        font = get_font(size, weight, style)
-        w = font.measure(word)
-        if self.cursor_x + w > WIDTH - HSTEP:
+    def word(self, word: str, size: int, weight: FontWeight, style: FontStyle) -> None:
+        self.pending.append((word, (size, weight, style)))
+        if len(self.pending) >= MEASURE_BATCH:
+            self.place_pending()
+
+    def place_pending(self) -> None:
+        if not self.pending: return
+
+        words_by_font: dict[FontDefinition, t.List[str]] = {}
+        for word, key in self.pending:
+            words_by_font.setdefault(key, []).append(word)
+
+        for key, words in words_by_font.items():
+            measure_many(key, words)
+
+        for word, key in self.pending:
+            self.place(word, key)
+
+        self.pending = []
+
+    def place(self, word: str, key: FontDefinition) -> None:
+        font, space_w, metrics = get_font(*key)
+        w = measure(key, font, word)
+        if self.cursor_x + w > RIGHT_MARGIN:
             self.flush()
-        self.line.append((self.cursor_x, word, font))
-        self.cursor_x += w + font.measure(" ")
+        self.line.append(LineEntry(self.cursor_x, word, font, metrics))
+        self.cursor_x += w + space_w
 
-    def flush(self):
+    def flush(self) -> None:
         if not self.line: return
 
-        metrics = [font.metrics() for _, _, font in self.line]
+        # Metrics are shared per font, so only compare each font once
+        metrics = {id(entry.metrics): entry.metrics for entry in self.line}.values()
 
         max_ascent = max([metric["ascent"] for metric in metrics])
-        baseline = self.cursor_y + 1.25 * max_ascent
+        baseline = self.cursor_y + LEADING * max_ascent
 
-        for x, word, font in self.line:
-            y = baseline - font.metrics("ascent")
-            self.display_list.append((x, y, word, font))
+        # Consecutive words sharing a font become a single entry, drawn with one create_text
+        for _, run in itertools.groupby(self.line, key=lambda entry: entry.font.name):
+            entries = list(run)
+            first = entries[0]
+            y = baseline - first.metrics["ascent"]
+            word = " ".join([entry.word for entry in entries])
+            self.display_list.append((first.x, y, word, first.font, first.metrics))
 
         max_descent = max([metric["descent"] for metric in metrics])
 
-        self.cursor_y = baseline + 1.25 * max_descent
+        self.cursor_y = baseline + LEADING * max_descent
         self.cursor_x = HSTEP
         self.line = []
 
 
 class Browser:
-    def __init__(self):
+    def __init__(self) -> None:
         self.window = tkinter.Tk()
         self.canvas = tkinter.Canvas(
             self.window,
@@ -137,21 +304,87 @@ class Browser:
 
         self.scroll = 0
         self.window.bind("<Down>", func=self.scrolldown)
-        self.display_list = []
 
-    def load(self, url: str):
-        body = ewb.request(url)
-        root = ewb.load(body)
-        self.display_list = Layout(root).display_list
+        # Display list stored as parallel arrays so culling is vectorized
+        self.xs = np.empty(0, dtype=np.float32)
+        self.ys = np.empty(0, dtype=np.float32)
+        self.linespaces = np.empty(0, dtype=np.float32)
+        # Running max of entry bottoms and running min (from the end) of entry
+        # tops. Entries of a line have different y per font, so ys alone is
+        # not sorted, but these bounds are and can be binary searched
+        self.max_bottoms = np.empty(0, dtype=np.float32)
+        self.min_tops = np.empty(0, dtype=np.float32)
+        self.words: t.List[str] = []
+        self.fonts: t.List['tkinter.font.Font'] = []
+
+        # Canvas items currently drawn, one per display list index in visible_range
+        self.visible_range = (0, 0)
+        self.item_ids: t.List[int] = []
+
+    def load(self, url: str) -> None:
+        root = fetch_and_parse(url)
+        display_list = Layout(root).display_list
+
+        # Arrays are allocated once at their final size
+        n = len(display_list)
+        self.xs = np.fromiter((x for x, _, _, _, _ in display_list), dtype=np.float32, count=n)
+        self.ys = np.fromiter((y for _, y, _, _, _ in display_list), dtype=np.float32, count=n)
+        self.linespaces = np.fromiter(
+            (metrics["linespace"] for _, _, _, _, metrics in display_list),
+            dtype=np.float32, count=n
+        )
+        self.max_bottoms = np.maximum.accumulate(self.ys + self.linespaces)
+        self.min_tops = np.minimum.accumulate(self.ys[::-1])[::-1]
+        self.words = [word for _, _, word, _, _ in display_list]
+        self.fonts = [font for _, _, _, font, _ in display_list]
         self.draw()
 
-    def draw(self):
+    def get_visible_range(self) -> t.Tuple[int, int]:
+        # Every entry before start ends above the viewport and every entry
+        # from end on starts below it
+        start = int(np.searchsorted(self.max_bottoms, self.scroll, side="left"))
+        end = int(np.searchsorted(self.min_tops, self.scroll + HEIGHT, side="right"))
+        if start >= end: return (0, 0)
+        return (start, end)
+
+    def draw_range(self, start: int, end: int) -> t.List[int]:
+        return [
+            self.canvas.create_text(
+                float(self.xs[i]), float(self.ys[i]) - self.scroll,
+                text=self.words[i], font=self.fonts[i], anchor="nw"
+            )
+            for i in range(start, end)
+        ]
+
+    def draw(self) -> None:
         self.canvas.delete("all")
-        for x, y, word, font in self.display_list:
-            if y > self.scroll + HEIGHT: continue
-            if y + font.metrics("linespace") < self.scroll: continue
-            self.canvas.create_text(x, y - self.scroll, text=word, font=font, anchor="nw")
+        self.visible_range = self.get_visible_range()
+        self.item_ids = self.draw_range(*self.visible_range)
+
+    def update_visible(self) -> None:
+        start, end = self.visible_range
+        new_start, new_end = self.get_visible_range()
+        keep_start, keep_end = max(start, new_start), min(end, new_end)
+
+        # Nothing on screen can be reused
+        if keep_start >= keep_end:
+            self.draw()
+            return
+
+        stale = self.item_ids[:keep_start - start] + self.item_ids[keep_end - start:]
+        if stale:
+            self.canvas.delete(*stale)
+
+        self.item_ids = (
+            self.draw_range(new_start, keep_start)
+            + self.item_ids[keep_start - start:keep_end - start]
+            + self.draw_range(keep_end, new_end)
+        )
+        self.visible_range = (new_start, new_end)
 
-    def scrolldown(self, e: 'tkinter.Event[tkinter.Misc]'):
+    def scrolldown(self, e: 'tkinter.Event[tkinter.Misc]') -> None:
         self.scroll += SCROLL_STEP
-        self.draw()
+        # Shift what is already drawn and only create/delete entries
+        # that entered or left the viewport
+        self.canvas.move("all", 0, -SCROLL_STEP)
+        self.update_visible()
@@ -1,13 +1,18 @@
 use std::collections::HashMap;
 
-use crate::html::{HTMLParser, Node, NodeData};
+use crate::html::{HTMLParser, Node};
 use crate::url::{URLError, URL};
 
 use pyo3::prelude::*;
+use pyo3::types::PyBytes;
 use pyo3::{exceptions::PyValueError, pyfunction, PyResult};
 
+// Elements whose text content is CSS / JS and never laid out
+static SKIPPED_LAYOUT_TAGS: [&'static str; 2] = ["script", "style"];
+
 #[pyclass]
 #[derive(Clone)]
+#[cfg_attr(test, derive(Debug, PartialEq))]
 pub struct PyNodeData {
     #[pyo3(get)]
     pub tag_name: String,
@@ -17,6 +22,7 @@ pub struct PyNodeData {
 
 #[pyclass]
 #[derive(Clone)]
+#[cfg_attr(test, derive(Debug, PartialEq))]
 pub struct PyNode {
     #[pyo3(get)]
     pub children: Vec<PyNode>,
@@ -33,17 +39,22 @@ impl PyNode {
     fn get_all_nodes(&self) -> Vec<PyNode> {
         let mut res = Vec::new();
 
-        if self.data.tag_name != "text" {
-            res.push(self.clone());
-        }
-
-        for child in &self.children {
-            res.extend(child.get_all_nodes());
-        }
+        self.collect_all_nodes(&mut res);
 
         res
     }
 
+    /// Flattens the tree into (tag name, immediate text content) pairs, in the
+    /// same order as `get_all_nodes`, without building a `PyNode` per element.
+    /// `script` and `style` subtrees are skipped
+    fn get_layout_tokens(&self) -> Vec<(String, Option<String>)> {
+        let mut tokens = Vec::new();
+
+        self.collect_layout_tokens(&mut tokens);
+
+        tokens
+    }
+
     fn get_text_nodes(&self) -> Vec<PyNode> {
         self.get_nodes("text")
     }
@@ -63,15 +74,53 @@ impl PyNode {
     fn get_nodes(&self, node_type: &str) -> Vec<PyNode> {
         let mut res = Vec::new();
 
+        self.collect_nodes(node_type, &mut res);
+
+        res
+    }
+}
+
+// Traversals push into a single output vector instead of allocating and
+// extending one vector per visited node
+impl PyNode {
+    fn collect_all_nodes(&self, nodes: &mut Vec<PyNode>) {
+        if self.data.tag_name != "text" {
+            nodes.push(self.clone());
+        }
+
+        for child in &self.children {
+            child.collect_all_nodes(nodes);
+        }
+    }
+
+    fn collect_nodes(&self, node_type: &str, nodes: &mut Vec<PyNode>) {
         for child in &self.children {
             if child.data.tag_name == node_type {
-                res.push(child.clone());
+                nodes.push(child.clone());
             } else {
-                res.extend(child.get_nodes(node_type));
+                child.collect_nodes(node_type, nodes);
             }
         }
+    }
 
-        res
+    fn collect_layout_tokens(&self, tokens: &mut Vec<(String, Option<String>)>) {
+        if self.data.tag_name == "text"
+            || SKIPPED_LAYOUT_TAGS.contains(&self.data.tag_name.as_str())
+        {
+            return;
+        }
+
+        let content = self
+            .children
+            .iter()
+            .find(|child| child.data.tag_name == "text")
+            .and_then(|text_node| text_node.data.attributes.get("content").cloned());
+
+        tokens.push((self.data.tag_name.clone(), content));
+
+        for child in &self.children {
+            child.collect_layout_tokens(tokens);
+        }
     }
 }
 
@@ -87,26 +136,15 @@ impl From<&Node> for PyNode {
     }
 }
 
-impl Into<Node> for &PyNode {
-    fn into(self) -> Node {
-        Node {
-            children: self.children.iter().map(|node| node.into()).collect(),
-            data: NodeData {
-                tag_name: self.data.tag_name.clone(),
-                attributes: self.data.attributes.clone(),
-            },
-        }
-    }
-}
-
-#[pyfunction]
-pub fn request(url: &str) -> PyResult<String> {
+fn fetch_body(url: &str) -> PyResult<(usize, String)> {
     let mut url_intent = URL::new(url.to_string());
 
     match &mut url_intent {
         Ok(url) => {
-            if let Ok(response) = url.request() {
-                Ok(response.clone())
+            if url.request().is_ok() {
+                // Move the body out instead of cloning it, so only one copy
+                // of the page is alive while it is handed to Python
+                Ok((url.status(), url.take_body()))
             } else {
                 Err(PyValueError::new_err("Error: unable to send request"))
             }
@@ -124,6 +162,25 @@ pub fn request(url: &str) -> PyResult<String> {
     }
 }
 
+#[pyfunction]
+pub fn request(url: &str) -> PyResult<String> {
+    let (_, body) = fetch_body(url)?;
+
+    Ok(body)
+}
+
+/// Same as `request` but returns the status code along with the body as
+/// `bytes`, skipping the UTF-8 decoding into a Python `str`
+#[pyfunction]
+pub fn request_bytes<'py>(
+    py: Python<'py>,
+    url: &str,
+) -> PyResult<(usize, Bound<'py, PyBytes>)> {
+    let (status, body) = fetch_body(url)?;
+
+    Ok((status, PyBytes::new(py, body.as_bytes())))
+}
+
 #[pyfunction]
 pub fn load(body: &str) -> PyResult<PyNode> {
     let mut parser = HTMLParser::new(body);
@@ -132,13 +189,71 @@ pub fn load(body: &str) -> PyResult<PyNode> {
     Ok(PyNode::from(&root))
 }
 
+/// Parses a UTF-8 encoded body borrowed straight from a Python `bytes` object
+#[pyfunction]
+pub fn load_bytes(body: &[u8]) -> PyResult<PyNode> {
+    match std::str::from_utf8(body) {
+        Ok(body) => load(body),
+        Err(_) => Err(PyValueError::new_err("Error: body is not valid UTF-8")),
+    }
+}
+
 #[pyfunction]
 pub fn find_text_nodes(pynode: &PyNode) -> PyResult<Vec<PyNode>> {
-    let node: Node = pynode.into();
-    let text_nodes = node.find_text_nodes();
+    Ok(pynode.get_text_nodes())
+}
+
+#[cfg(test)]
+mod tests {
+    use super::*;
+
+    fn token(tag_name: &str, content: Option<&str>) -> (String, Option<String>) {
+        (tag_name.to_string(), content.map(|c| c.to_string()))
+    }
+
+    #[test]
+    fn test_layout_tokens_skip_script_and_style() {
+        let html = r#"<html><head><style>body{color:red}</style><title>Example Domain</title><script>let answer = 42;</script></head><body><h1>Welcome</h1><p>Some <b>bold</b> text</p></body></html>"#;
+        let root = PyNode::from(&HTMLParser::new(html).parse().unwrap());
+
+        assert_eq!(
+            root.get_layout_tokens(),
+            vec![
+                token("html", None),
+                token("head", None),
+                token("title", Some("Example Domain")),
+                token("body", None),
+                token("h1", Some("Welcome")),
+                token("p", Some("Some ")),
+                token("b", Some("bold")),
+            ]
+        );
+    }
+
+    #[test]
+    fn test_load_bytes_matches_load() {
+        let html = r#"<html><body><h1 class="title">Welcome</h1><p>一派白虹起，<b>千寻雪浪飞。</b></p></body></html>"#;
+
+        assert_eq!(load_bytes(html.as_bytes()).unwrap(), load(html).unwrap());
+    }
 
-    Ok(text_nodes
-        .iter()
-        .map(|n| PyNode::from(n.to_owned()))
-        .collect())
+    #[test]
+    fn test_load_bytes_invalid_utf8() {
+        assert!(load_bytes(b"<p>\xff</p>").is_err());
+    }
+
+    #[test]
+    fn test_layout_tokens_skip_nested_script() {
+        let html = r#"<div><p>Before</p><script><p>not a paragraph</p></script><p>After</p></div>"#;
+        let root = PyNode::from(&HTMLParser::new(html).parse().unwrap());
+
+        assert_eq!(
+            root.get_layout_tokens(),
+            vec![
+                token("div", None),
+                token("p", Some("Before")),
+                token("p", Some("After")),
+            ]
+        );
+    }
 }
@@ -239,6 +239,15 @@ impl URL {
             self.http_request()
         }
     }
+
+    pub fn status(&self) -> usize {
+        self._response._status
+    }
+
+    /// Takes ownership of the last response body, leaving it empty
+    pub fn take_body(&mut self) -> String {
+        std::mem::take(&mut self._response._body)
+    }
 }
 
 #[cfg(test)]
@@ -309,6 +318,18 @@ mod tests {
         assert!(url._response._body.len() > 0);
     }
 
+    #[test]
+    fn test_take_body() {
+        let mut url =
+            URL::new("https://browser.engineering/examples/example1-simple.html".to_string())
+                .unwrap();
+        url.request().unwrap();
+        let body = url.take_body();
+
+        assert!(body.len() > 0);
+        assert!(url._response._body.is_empty());
+    }
+
     #[test]
     fn test_http() {
         let mut url =